@@ -1,15 +1,23 @@
 import os
 import time
 import sys
-import requests
+import asyncio
+import httpx
+import orjson
 import pandas as pd
 from dotenv import load_dotenv
 from loguru import logger
 import ipaddress
+import importlib.util
+import functools
+import hashlib
+import re
+import zipfile
+from collections import defaultdict
+from contextlib import contextmanager
 
-# For coloring cells / applying formats
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
+# xlsxwriter opens its output ZipFile from this module (see _xlsx_compresslevel)
+import xlsxwriter.workbook
 
 # ------------------------------------------------------------------------------------
 # Configure the logger (Loguru)
@@ -35,6 +43,40 @@ load_dotenv()
 API_KEY = os.getenv("API_KEY")
 BASE_URL = os.getenv("BASE_URL", "https://api.thousandeyes.com/v7")
 
+# Optional page size for /endpoint/agents (sent as the `max` query parameter).
+# The endpoint pages with an opaque cursor, so pages can't be fetched in
+# parallel; bigger pages mean fewer round trips. Unset = API default.
+ENDPOINT_AGENTS_PAGE_SIZE = os.getenv("ENDPOINT_AGENTS_PAGE_SIZE") or None
+if ENDPOINT_AGENTS_PAGE_SIZE is not None and not (
+        ENDPOINT_AGENTS_PAGE_SIZE.isdigit() and int(ENDPOINT_AGENTS_PAGE_SIZE) >= 1):
+    # Caught here rather than as an API 400 on the first endpoint agents call
+    logger.error(f"ENDPOINT_AGENTS_PAGE_SIZE must be a positive integer, got '{ENDPOINT_AGENTS_PAGE_SIZE}'.")
+    raise ValueError("ENDPOINT_AGENTS_PAGE_SIZE must be a positive integer.")
+
+# Account groups input file: .xlsx, or .csv (fastest to read)
+ACCOUNT_IDS_FILE = os.getenv("ACCOUNT_IDS_FILE", "account_ids.xlsx")
+
+# Read .xlsx input with the Rust-based calamine engine when python-calamine is
+# installed (much faster than openpyxl); otherwise use the pandas default.
+EXCEL_READ_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# Parsed .xlsx input (as JSON, keyed on the file's hash) and /usage frames
+# (as parquet, keyed on the response body's hash) are cached here, so
+# unchanged data skips parsing on the next run. Both are plain data formats;
+# loading a cache file never runs code.
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+# The usage cache needs pyarrow (which also round-trips the nullable usage
+# dtypes); without it usage is simply parsed on every run.
+USAGE_CACHE_ENABLED = importlib.util.find_spec("pyarrow") is not None
+
+# Mixed into the usage cache key; bump it whenever _parse_usage's output
+# changes (the USAGE_*_DTYPES schemas are mixed in automatically).
+USAGE_CACHE_VERSION = 1
+
+# Keys of fetch_usage's dict of DataFrames (also the cache file suffixes)
+USAGE_FRAMES = ("summary", "tests", "endpoint_agents", "enterprise_agents")
+
 # Common headers for most calls
 HEADERS = {
     "Authorization": f"Bearer {API_KEY}",
@@ -45,319 +87,490 @@ HEADERS = {
 HEADERS_HAL = HEADERS.copy()
 HEADERS_HAL["Accept"] = "application/hal+json"
 
+# Shared HTTP connection pool settings. All requests go through a single
+# httpx.AsyncClient; the semaphore caps how many are in flight at once so we
+# stay within the API rate limits (override with MAX_CONCURRENT_REQUESTS).
+# The pool is sized to that cap, so every in-flight request can get a
+# connection and every connection is kept alive for reuse.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "20"))
+if MAX_CONCURRENT_REQUESTS < 1:
+    # A zero-permit semaphore would never let a request through (silent hang)
+    logger.error(f"MAX_CONCURRENT_REQUESTS must be at least 1, got {MAX_CONCURRENT_REQUESTS}.")
+    raise ValueError("MAX_CONCURRENT_REQUESTS must be at least 1.")
+HTTP_LIMITS = httpx.Limits(
+    max_connections=MAX_CONCURRENT_REQUESTS,
+    max_keepalive_connections=MAX_CONCURRENT_REQUESTS
+)
+HTTP_TIMEOUT = 30
+
+# Retry policy. Connection failures are retried by the transport; read
+# timeouts / transport errors and throttled or failed responses are retried
+# in _get_bytes() with exponential backoff
+# (0.5s, 1s, 2s, ...), or after the server's Retry-After seconds if given
+# (capped at HTTP_MAX_RETRY_AFTER so a huge value can't stall the run).
+HTTP_CONNECT_RETRIES = 3
+HTTP_MAX_RETRIES = 5
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_MAX_RETRY_AFTER = 60
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# xlsxwriter Workbook options. The output is a plain data dump, so strings
+# that look like URLs (e.g. scheduled test 'server' values) are written as
+# text rather than being regex-matched and turned into hyperlink objects.
+# constant_memory streams each row to disk as it is written (write-only).
+XLSX_WORKBOOK_OPTIONS = {
+    "strings_to_urls": False,
+    "constant_memory": True,
+    "nan_inf_to_errors": True
+}
+
+# Excel's worksheet size limits. xlsxwriter silently drops cells past them
+# (write_row just returns -1), so _write_sheet checks each sheet up front.
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_COLS = 16384
+
+# Header row style (matches what pandas' to_excel used to produce)
+XLSX_HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+
+# Deflate level for the output .xlsx (zlib default is 6). The report is a
+# transient artifact, so trade a slightly larger file for a much faster save.
+XLSX_COMPRESSLEVEL = 1
+
+# Empty sheets are left out of the workbook, except these (which downstream
+# consumers expect to always find)
+XLSX_ENSURE_SHEETS = {"Account Groups"}
 
-def _apply_color_fills(excel_file: str, sheet_name: str = "Labels",
-                       color_col: str = "color"):
+# Text cells matching this are written to Excel as numbers
+# (see _coerce_numeric_columns)
+NUMERIC_TEXT_PATTERN = r"-?(?:0|[1-9][0-9]{0,14})"
+
+# Output columns of each per-AID fetcher, in order. Fetchers accumulate one
+# list per column and build their DataFrame from that dict in one step.
+AGENT_FIELDS = (
+    "OrgId", "agentId", "agentName", "agentType", "agentState", "lastSeen",
+    "createdDate", "utilization", "location", "enabled", "hostname", "ipAddresses"
+)
+ENDPOINT_AGENT_FIELDS = (
+    "id", "name", "computerName", "osVersion", "platform", "lastSeen", "status",
+    "deleted", "version", "createdAt", "numberOfClients", "locationName",
+    "agentType", "licenseType",
+    "usernames", "localIpv4", "gatewayIpv4", "hardwareTypes", "vpnInfo"
+)
+ENTERPRISE_TEST_FIELDS = (
+    "testID", "testName", "createdBy", "createdDate", "modifiedBy", "modifiedDate",
+    "type", "alertsEnabled", "enabled", "direction", "targetAgentID"
+)
+SCHEDULED_TEST_FIELDS = (
+    "testID", "testName", "server", "createdDate", "type", "isEnabled",
+    "agentSelectorType", "assignedAgentsRaw", "assignedLabelsRaw", "maxMachines"
+)
+LABEL_FIELDS = (
+    "id", "name", "color", "matchType", "local_network_filter", "vpn_vendor_filter",
+    "connection_filter", "username_filter", "agent_id_filter"
+)
+
+# Full sheet columns of each category: the account group identifiers that
+# _with_account_group prepends, then the fetcher's own fields. main() builds
+# every category frame (including the empty fallback) with these.
+ACCOUNT_GROUP_COLUMNS = ("accountGroupName", "aid")
+AGENT_COLUMNS = ACCOUNT_GROUP_COLUMNS + AGENT_FIELDS
+ENDPOINT_AGENT_COLUMNS = ACCOUNT_GROUP_COLUMNS + ENDPOINT_AGENT_FIELDS
+ENTERPRISE_TEST_COLUMNS = ACCOUNT_GROUP_COLUMNS + ENTERPRISE_TEST_FIELDS
+SCHEDULED_TEST_COLUMNS = ACCOUNT_GROUP_COLUMNS + SCHEDULED_TEST_FIELDS
+LABEL_COLUMNS = ACCOUNT_GROUP_COLUMNS + LABEL_FIELDS
+
+# Label filter column -> filter key understood by _agents_matching_filter
+LABEL_FILTER_KEYS = {
+    "agent_id_filter": "agent-id",
+    "username_filter": "username",
+    "local_network_filter": "local-network",
+    "vpn_vendor_filter": "vpn-vendor",
+    "connection_filter": "connection",
+}
+
+# Column -> dtype of each /usage frame, in column order. The schemas are
+# fixed, so fetch_usage casts to them instead of leaving pandas to infer
+# object columns; nullable dtypes keep missing API values as empty cells.
+# Breakdown columns are copied straight from the API record key of the same
+# name.
+USAGE_SUMMARY_DTYPES = {
+    "aid": "string", "monthStart": "string", "monthEnd": "string",
+    "cloudUnitsIncluded": "Float64", "deviceAgentsIncluded": "Int64",
+    "enterpriseAgentsIncluded": "Int64", "endpointAgentsIncluded": "Int64",
+    "endpointAgentsEssentialsIncluded": "Int64",
+    "cloudUnitsUsed": "Float64", "cloudUnitsProjected": "Float64",
+    "cloudUnitsNextBillingPeriod": "Float64",
+    "enterpriseUnitsUsed": "Float64", "enterpriseUnitsProjected": "Float64",
+    "enterpriseUnitsNextBillingPeriod": "Float64",
+    "enterpriseAgentsUsed": "Int64", "endpointAgentsUsed": "Int64",
+    "endpointAgentsEssentialsUsed": "Int64",
+    "connectedDevicesUnitsUsed": "Float64", "connectedDevicesUnitsProjected": "Float64",
+    "connectedDevicesUnitsNextBillingPeriod": "Float64"
+}
+USAGE_TEST_DTYPES = {
+    "aid": "string", "testId": "string", "accountGroupName": "string",
+    "testName": "string", "testType": "string",
+    "cloudUnitsUsed": "Float64", "cloudUnitsProjected": "Float64"
+}
+USAGE_ENDPOINT_AGENT_DTYPES = {
+    "aid": "string", "accountGroupName": "string", "endpointAgentsUsed": "Int64"
+}
+USAGE_ENTERPRISE_AGENT_DTYPES = {
+    "aid": "string", "accountGroupName": "string", "enterpriseAgentsUsed": "Int64"
+}
+
+# Output column -> API record key, for the columns copied straight from each
+# record. Fetchers project these with one comprehension per column; derived
+# columns (joined lists, nested lookups) are filled in separately.
+AGENT_SOURCE_KEYS = {
+    "OrgId": "orgId", "agentId": "agentId", "agentName": "agentName",
+    "agentType": "agentType", "agentState": "agentState", "lastSeen": "lastSeen",
+    "createdDate": "createdDate", "utilization": "utilization",
+    "location": "location", "enabled": "enabled", "hostname": "hostname"
+}
+ENDPOINT_AGENT_SOURCE_KEYS = {
+    "id": "id", "name": "name", "computerName": "computerName",
+    "osVersion": "osVersion", "platform": "platform", "lastSeen": "lastSeen",
+    "status": "status", "deleted": "deleted", "version": "version",
+    "createdAt": "createdAt", "numberOfClients": "numberOfClients",
+    "agentType": "agentType", "licenseType": "licenseType"
+}
+ENTERPRISE_TEST_SOURCE_KEYS = {
+    "testID": "testId", "testName": "testName", "createdBy": "createdBy",
+    "createdDate": "createdDate", "modifiedBy": "modifiedBy",
+    "modifiedDate": "modifiedDate", "type": "type", "alertsEnabled": "alertsEnabled",
+    "enabled": "enabled", "direction": "direction", "targetAgentID": "targetAgentId"
+}
+
+
+async def _get_bytes(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                     url: str, headers: dict = None) -> bytes:
+    """
+    GET `url` through the shared client (bounded by `sem`) and return the
+    raw response body. Transport errors (timeouts, dropped connections) and
+    responses with a status in HTTP_RETRY_STATUSES are retried up to
+    HTTP_MAX_RETRIES times with backoff, waiting for the Retry-After header
+    (at most HTTP_MAX_RETRY_AFTER seconds) when the server sends one; the
+    semaphore is released while backing off.
+    Raises for non-2xx responses.
     """
-    Open the given Excel file with openpyxl and apply cell background
-    colors in the given sheet, based on the hex codes in `color_col`.
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        try:
+            async with sem:
+                resp = await client.get(url, headers=headers)
+        except httpx.TransportError as e:
+            # Timeouts, dropped connections, protocol errors mid-response
+            if attempt == HTTP_MAX_RETRIES:
+                raise
+            delay = HTTP_BACKOFF_FACTOR * (2 ** attempt)
+            logger.warning(
+                f"{type(e).__name__} from '{url}'; retrying in {delay:.1f}s "
+                f"({attempt + 1}/{HTTP_MAX_RETRIES})...")
+            await asyncio.sleep(delay)
+            continue
+
+        if resp.status_code not in HTTP_RETRY_STATUSES or attempt == HTTP_MAX_RETRIES:
+            break
+
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            delay = min(int(retry_after), HTTP_MAX_RETRY_AFTER)
+        else:
+            delay = HTTP_BACKOFF_FACTOR * (2 ** attempt)
+        logger.warning(
+            f"HTTP {resp.status_code} from '{url}'; retrying in {delay:.1f}s "
+            f"({attempt + 1}/{HTTP_MAX_RETRIES})...")
+        await asyncio.sleep(delay)
+
+    resp.raise_for_status()
+    return resp.content
+
+
+async def _get_json(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                    url: str, headers: dict = None):
+    """
+    Like _get_bytes, but return the decoded JSON body.
+    """
+    # orjson parses the raw bytes directly and is several times faster than
+    # the stdlib json behind resp.json() on the large paginated bodies
+    return orjson.loads(await _get_bytes(client, sem, url, headers=headers))
+
+
+@contextmanager
+def _xlsx_compresslevel(level: int):
+    """
+    Make xlsxwriter write its .xlsx container with the given deflate
+    `compresslevel` while the context is active. xlsxwriter has no option
+    for this, so its module-level ZipFile reference is swapped for a
+    partial and restored afterwards.
+    """
+    original_zipfile = xlsxwriter.workbook.ZipFile
+    xlsxwriter.workbook.ZipFile = functools.partial(zipfile.ZipFile, compresslevel=level)
+    try:
+        yield
+    finally:
+        xlsxwriter.workbook.ZipFile = original_zipfile
+
+
+def _color_fill_formats(workbook: xlsxwriter.Workbook, df: pd.DataFrame,
+                        sheet_name: str = "Labels", color_col: str = "color"):
+    """
+    Build the cell background fills for `color_col` of `df`, based on the
+    hex codes it contains. Returns a list with one entry per row of `df`:
+    the xlsxwriter Format to write that row's color cell with, or None to
+    leave it unfilled. Returns None if `color_col` isn't in `df`.
 
     - If color_col has #93249F or 93249F, we fill the cell with that color.
-    - Hex must be exactly 6 characters after removing the optional '#' or we skip.
+    - Hex must be exactly 6 hex digits after removing the optional '#' or we skip.
     """
     logger.info(
         f"Applying cell color fills in '{sheet_name}' using column '{color_col}'...")
-    wb = load_workbook(excel_file)
 
-    if sheet_name not in wb.sheetnames:
-        logger.warning(f"Sheet '{sheet_name}' not found; skipping color fills.")
-        wb.close()
-        return
+    if color_col not in df.columns:
+        logger.warning(
+            f"Column '{color_col}' not found in '{sheet_name}' sheet; skipping color fills.")
+        return None
+
+    # Normalize and validate every color code in one vectorized pass:
+    # strip whitespace, remove one leading "#", upper-case, then require 6 hex digits
+    values = df[color_col]
+    hex_codes = (
+        values.fillna("").astype(str)
+        .str.strip().str.removeprefix("#").str.upper()
+    )
+    valid = hex_codes.str.fullmatch(r"[0-9A-F]{6}")
 
-    ws = wb[sheet_name]
+    for row_idx in (~valid & (hex_codes != "")).to_numpy().nonzero()[0]:
+        logger.debug(
+            f"Skipping invalid color code '{values.iat[row_idx]}' in row {row_idx + 2}.")
 
-    # Find the column index for color_col.
-    col_index = None
-    for cell in ws[1]:  # row 1 => headers
-        if cell.value == color_col:
-            col_index = cell.column  # 1-based index
-            break
+    # One xlsxwriter Format per distinct color, shared by every cell using it
+    formats = {
+        hex_code: workbook.add_format({"bg_color": f"#{hex_code}"})
+        for hex_code in hex_codes[valid].unique()
+    }
+    return [
+        formats[hex_code] if is_valid else None
+        for hex_code, is_valid in zip(hex_codes.to_numpy(), valid.to_numpy())
+    ]
 
-    if col_index is None:
-        logger.warning(
-            f"Column '{color_col}' not found in '{sheet_name}' sheet; skipping color fills.")
-        wb.close()
-        return
 
-    # Iterate from row 2 downward because row 1 is the header
-    for row_idx in range(2, ws.max_row + 1):
-        cell = ws.cell(row=row_idx, column=col_index)
-        color_val = str(cell.value).strip() if cell.value else ""
-        if not color_val:
+def _write_sheet(workbook: xlsxwriter.Workbook, sheet_name: str, df: pd.DataFrame,
+                 header_fmt, color_col: str = None):
+    """
+    Stream `df` into a new worksheet one row at a time. The workbook is in
+    constant_memory mode, so each row is flushed to disk as soon as the next
+    one starts and cells can't be revisited later.
+
+    If `color_col` is given, that column's cells are filled with their hex
+    color (see _color_fill_formats) as each row is written.
+
+    Raises ValueError if `df` (plus its header row) doesn't fit in a sheet.
+    """
+    n_rows, n_cols = len(df) + 1, len(df.columns)
+    if n_rows > XLSX_MAX_ROWS or n_cols > XLSX_MAX_COLS:
+        logger.error(f"Sheet '{sheet_name}' is too large for Excel ({n_rows} rows, {n_cols} columns).")
+        raise ValueError(
+            f"Sheet '{sheet_name}' is too large: {n_rows} rows, {n_cols} columns "
+            f"(max {XLSX_MAX_ROWS} rows, {XLSX_MAX_COLS} columns).")
+
+    ws = workbook.add_worksheet(sheet_name)
+    ws.write_row(0, 0, df.columns.tolist(), header_fmt)
+
+    fills = _color_fill_formats(workbook, df, sheet_name, color_col) if color_col else None
+    col_index = df.columns.get_loc(color_col) if fills is not None else None
+
+    # Missing values (NaN / None / NA) are written as blank cells
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    for row_idx, row in enumerate(rows, start=1):  # row 0 is the header
+        ws.write_row(row_idx, 0, row)
+        if fills is not None and fills[row_idx - 1] is not None:
+            ws.write(row_idx, col_index, row[col_index], fills[row_idx - 1])
+
+
+def _coerce_numeric_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return `df` with every text column whose non-empty values are all whole
+    numbers (e.g. "12", "140737488492028") converted to a numeric dtype, so
+    _write_sheet's write_row calls emit real numeric cells instead of
+    numbers-as-text.
+
+    Rules:
+    - Columns that are already numeric (or bool) are left alone.
+    - Empty / missing cells are ignored when deciding, and stay empty.
+    - Only values matching NUMERIC_TEXT_PATTERN count, so the conversion is
+      lossless: no leading zeros, at most 15 digits (what Excel stores
+      exactly), and no commas or dots. Comma-joined lists like "900,901"
+      and version strings like "10.10" stay text.
+    - If any non-empty value doesn't match, the column is left unchanged.
+    """
+    converted = {}
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
             continue
 
-        # Remove a leading "#" if present
-        if color_val.startswith("#"):
-            color_val = color_val[1:]
+        text = values.astype(str).str.strip()
+        non_empty = values.notna() & (text != "")
+        if not non_empty.any():
+            continue
 
-        # Must be exactly 6 hex digits (case-insensitive)
-        color_val = color_val.upper()
-        if len(color_val) == 6:
-            fill = PatternFill(start_color=color_val, end_color=color_val,
-                               fill_type="solid")
-            cell.fill = fill
-        else:
-            logger.debug(f"Skipping invalid color code '{cell.value}' in row {row_idx}.")
+        if text[non_empty].str.fullmatch(NUMERIC_TEXT_PATTERN).all():
+            converted[col] = pd.to_numeric(text.where(non_empty))
 
-    wb.save(excel_file)
-    wb.close()
-    logger.info(f"Cell coloring applied; file re-saved as '{excel_file}'.")
+    return df.assign(**converted) if converted else df
 
 
-def _auto_format_numbers(excel_file: str):
+def _downcast_integer_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return `df` with each integer column (including nullable Int64) stored in
+    the smallest integer dtype that holds its values, e.g. numberOfClients or
+    endpointAgentsUsed -> int8/int16. This is lossless; float columns are left
+    at full precision, since float32 would change the values written to Excel.
     """
-    After writing the DataFrame to Excel, open it with openpyxl and
-    detect columns that are entirely numeric. For those columns,
-    set 'number_format' to 'General' (or '0', '#,##0.00', etc.).
+    downcast = {
+        col: pd.to_numeric(df[col], downcast="integer")
+        for col in df.columns if pd.api.types.is_integer_dtype(df[col])
+    }
+    return df.assign(**downcast) if downcast else df
 
-    This ensures Excel interprets them as numbers rather than text.
 
-    Rules:
-    - We skip the header row (row 1).
-    - If every non-empty cell in a column can be cast to float, we mark that column numeric.
-    - Then we apply 'number_format' to each cell in that column from row 2 downward.
+def _multi_value_index(endpoint_agents_df, col, lower=False):
     """
-    logger.info("Auto-formatting numeric columns in all sheets...")
-    wb = load_workbook(excel_file)
-
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-        logger.info(f"  Checking numeric columns in sheet '{sheet_name}'...")
-
-        # We'll find how many columns we have by checking row 1
-        max_col = ws.max_column
-        # row 1 is the header
-        for col_idx in range(1, max_col + 1):
-            is_numeric = True
-            for row_idx in range(2, ws.max_row + 1):
-                cell = ws.cell(row=row_idx, column=col_idx)
-                val = cell.value
-                if val is None or val == "":
-                    # skip empty
-                    continue
-                # If it's already a number in Python, that's good
-                if isinstance(val, (int, float)):
-                    continue
-                # If it's a string, attempt to parse float
-                if isinstance(val, str):
-                    try:
-                        float(val.replace(",", ""))  # remove comma if present
-                    except ValueError:
-                        is_numeric = False
-                        break
-                else:
-                    # Not int, not float, not string => not numeric
-                    is_numeric = False
-                    break
-
-            # If still numeric, apply a number format
-            if is_numeric:
-                # We'll do it from row 2 to last row
-                for row_idx in range(2, ws.max_row + 1):
-                    num_cell = ws.cell(row=row_idx, column=col_idx)
-                    # Set a number format
-                    # Could use '0', '#,##0', '#,##0.00', etc.
-                    num_cell.number_format = "General"
-
-    wb.save(excel_file)
-    wb.close()
-    logger.info(f"Numeric columns formatted in '{excel_file}'.")
-
-
-def ip_in_any_subnet(ip_str, subnet_str_list):
+    Explode a comma-joined agent column (e.g. usernames "HCA\\abc,HCA\\xyz")
+    into { value: set_of_row_positions }, with values stripped (and
+    lowercased if `lower`) and empty values dropped.
     """
-    Return True if ip_str (e.g. "10.0.0.130") is inside
-    any of the subnets in subnet_str_list (e.g. ["10.228.0.0/17"]).
+    exploded = pd.DataFrame({
+        "row": range(len(endpoint_agents_df)),
+        "value": endpoint_agents_df[col].fillna("").astype(str).str.split(",").to_numpy(),
+    }).explode("value")
+    values = exploded["value"].str.strip()
+    if lower:
+        values = values.str.lower()
+    exploded = exploded.assign(value=values)[values != ""]
+    return exploded.groupby("value", sort=False)["row"].agg(set).to_dict()
+
+
+def build_agent_lookups(endpoint_agents_df):
     """
-    try:
-        ip_obj = ipaddress.ip_address(ip_str)
-    except ValueError:
-        return False
+    Pre-index the endpoint agent columns that label filters match on, so
+    build_label_agents_map can resolve each filter with dict lookups instead
+    of testing every agent against every label. Indexes hold row positions
+    (a label's filters must all match the same agent row). Returns a dict:
+      - "ids"          : agent id of each row
+      - "agent_id"     : { str(id).strip(): set_of_rows }
+      - "username"     : { username: set_of_rows }
+      - "connection"   : { lowercased hardware type: set_of_rows }
+      - "local_ipv4"   : [ (ip_address, set_of_rows) ] for each distinct
+                         valid local IP (subnets can't be dict-keyed)
+      - "vpn_info"     : { lowercased vpnInfo string: set_of_rows }
+                         (vendors are substring-matched against these)
+    """
+    ids = endpoint_agents_df["id"].to_numpy()
 
-    for net_str in subnet_str_list:
+    agent_id_index = {}
+    for row, agent_id in enumerate(ids):
+        agent_id_index.setdefault(str(agent_id).strip(), set()).add(row)
+
+    local_ipv4 = []
+    for ip_str, rows in _multi_value_index(endpoint_agents_df, "localIpv4").items():
         try:
-            net = ipaddress.ip_network(net_str, strict=False)
+            local_ipv4.append((ipaddress.ip_address(ip_str), rows))
         except ValueError:
-            # If it's an invalid network string, skip
             continue
-        if ip_obj in net:
-            return True
 
-    return False
+    vpn_info_index = {}
+    for row, vpninfo_str in enumerate(endpoint_agents_df["vpnInfo"].fillna("").to_numpy()):
+        vpn_info_index.setdefault(str(vpninfo_str).lower(), set()).add(row)
+
+    return {
+        "ids": ids,
+        "agent_id": agent_id_index,
+        "username": _multi_value_index(endpoint_agents_df, "usernames"),
+        "connection": _multi_value_index(endpoint_agents_df, "hardwareTypes", lower=True),
+        "local_ipv4": local_ipv4,
+        "vpn_info": vpn_info_index,
+    }
 
 
-def agent_matches_filter(agent_row, filter_key, filter_values, mode="in"):
+def _agents_matching_filter(agent_lookups, filter_key, filter_values):
     """
-    Checks if `agent_row` satisfies a single filter dict, e.g.:
-      {
-        "key": "username",
-        "values": ["HCA\\xyz", "HCA\\abc"],
-        "mode": "in"
-      }
-    Return True if it passes, False otherwise.
-
-    `agent_row` is a Series from endpoint_agents_df, containing:
-      - agentRow["id"]
-      - agentRow["usernames"]
-      - agentRow["localIpv4"]
-      - agentRow["hardwareTypes"]
-      - ... etc.
-
-    For 'in' mode, we just check if there's an intersection or exact match.
+    Return the set of agent rows that satisfy a single label filter
+    (an 'in' match of `filter_values`), using the build_agent_lookups indexes.
     """
-    # We'll handle a few known filter keys:
-    filter_key = filter_key.lower().strip()
-    if mode.lower() != "in":
-        # For simplicity, only demonstrate 'in'.
-        # If you have 'not_in' or others, handle them similarly.
-        return False
+    # 1) agent-id / 2) username: exact match on any value
+    if filter_key in ("agent-id", "username"):
+        index = agent_lookups["agent_id" if filter_key == "agent-id" else "username"]
+        return set().union(*(index.get(v, ()) for v in filter_values))
 
-    # 1) agent-id
-    if filter_key == "agent-id":
-        # agentRow["id"] is a single string
-        agent_id = str(agent_row["id"]).strip()
-        return agent_id in filter_values
-
-    # 2) username
-    elif filter_key == "username":
-        # agentRow["usernames"] might be "HCA\\abc,HCA\\xyz"
-        # split them into a set:
-        agent_usernames = {u.strip() for u in agent_row["usernames"].split(",") if u}
-        # check if any overlap
-        return bool(agent_usernames.intersection(filter_values))
-
-    # 3) local-network
+    # 3) local-network: any of the agent's local IPs inside any of the subnets
     elif filter_key == "local-network":
-        # filter_values might be subnets like ["10.228.0.0/17", "192.168.1.0/24"]
-        # agentRow["localIpv4"] might be "10.228.5.100,192.168.1.55"
-        ip_list = [ip.strip() for ip in agent_row["localIpv4"].split(",") if ip]
-        for ip_str in ip_list:
-            if ip_in_any_subnet(ip_str, filter_values):
-                return True
-        return False
-
-    # 4) connection
+        networks = []
+        for net_str in filter_values:
+            try:
+                networks.append(ipaddress.ip_network(net_str, strict=False))
+            except ValueError:
+                # If it's an invalid network string, skip
+                continue
+        matched = set()
+        for ip_obj, rows in agent_lookups["local_ipv4"]:
+            if any(ip_obj in net for net in networks):
+                matched |= rows
+        return matched
+
+    # 4) connection: case-insensitive match on hardware type
     elif filter_key == "connection":
-        # agentRow["hardwareTypes"] might be "ethernet,wireless"
-        agent_hw = {t.strip().lower() for t in agent_row["hardwareTypes"].split(",") if t}
-        # filter_values might be ["Ethernet"] or ["Ethernet", "Wireless"]
-        filter_hw = {v.lower() for v in filter_values}
-        # check if there's an intersection
-        return bool(agent_hw.intersection(filter_hw))
-
-    # 5) vpn-vendor or vpnType
-    # If you store "vpnType" in agentRow, or parse agentRow["vpnInfo"],
-    # you'll need to check that. For example:
-    elif filter_key == "vpn-vendor" or filter_key == "vpnType":
-        # If you have a dedicated column agentRow["vpnType"], easy:
-        # return agentRow["vpnType"] in filter_values
-        #
-        # If you stored multiple in agentRow["vpnInfo"], you might parse them out
-        # or check for strings like "vpnType=cisco-anyconnect" ...
-        # For demonstration, just do a partial check:
-        vpninfo_str = agent_row["vpnInfo"] or ""
-        # e.g. "vpnType=cisco-anyconnect,gateway=1.2.3.4,client=10.1.2.3"
-        # We'll see if any 'filter_val' is in the line
-        for fv in filter_values:
-            if fv.lower() in vpninfo_str.lower():
-                return True
-        return False
+        index = agent_lookups["connection"]
+        return set().union(*(index.get(v.lower(), ()) for v in filter_values))
+
+    # 5) vpn-vendor: partial (substring) match against the vpnInfo line, e.g.
+    #    "vpnType=cisco-anyconnect,gateway=1.2.3.4,client=10.1.2.3"
+    elif filter_key == "vpn-vendor":
+        needles = [fv.lower() for fv in filter_values]
+        matched = set()
+        for vpninfo_str, rows in agent_lookups["vpn_info"].items():
+            if any(fv in vpninfo_str for fv in needles):
+                matched |= rows
+        return matched
 
     # fallback
-    return False
-
-
-def agent_matches_label(agent_row, label_row):
-    """
-    Return True if the agent matches all filters (if matchType=and)
-    or at least one filter (if matchType=or).
-    """
-    match_type = (label_row["matchType"] or "").lower().strip()
-    if not match_type:
-        match_type = "and"  # default if missing
-
-    # The label row might have columns for each filter key. For example:
-    #   label_row["agent_id_filter"] => "1234-abc...,5678-def..."
-    #   label_row["username_filter"] => "HCA\\abc,HCA\\xyz"
-    # We can parse each of these if non-empty into a single "filter" dict
-    # that calls agent_matches_filter.
-
-    # Build a list of filter dicts from the label row.
-    # (We do this because in your script, you store each key as a comma string).
-    filters_to_check = []
-
-    # agent_id_filter
-    if label_row.get("agent_id_filter"):
-        # split by comma
-        vals = [v.strip() for v in label_row["agent_id_filter"].split(",") if v.strip()]
-        filters_to_check.append({
-            "key": "agent-id",
-            "values": vals,
-            "mode": "in"
-        })
-
-    # username_filter
-    if label_row.get("username_filter"):
-        vals = [v.strip() for v in label_row["username_filter"].split(",") if v.strip()]
-        filters_to_check.append({
-            "key": "username",
-            "values": vals,
-            "mode": "in"
-        })
-
-    # local_network_filter
-    if label_row.get("local_network_filter"):
-        vals = [v.strip() for v in label_row["local_network_filter"].split(",") if v.strip()]
-        filters_to_check.append({
-            "key": "local-network",
-            "values": vals,
-            "mode": "in"
-        })
-
-    # vpn_vendor_filter
-    if label_row.get("vpn_vendor_filter"):
-        vals = [v.strip() for v in label_row["vpn_vendor_filter"].split(",") if v.strip()]
-        filters_to_check.append({
-            "key": "vpn-vendor",
-            "values": vals,
-            "mode": "in"
-        })
-
-    # connection_filter
-    if label_row.get("connection_filter"):
-        vals = [v.strip() for v in label_row["connection_filter"].split(",") if v.strip()]
-        filters_to_check.append({
-            "key": "connection",
-            "values": vals,
-            "mode": "in"
-        })
-
-    # Evaluate them
-    if match_type == "and":
-        # ALL must pass
-        return all(agent_matches_filter(agent_row, f["key"], f["values"], f["mode"]) for f in filters_to_check)
-    else:
-        # OR => any pass
-        return any(agent_matches_filter(agent_row, f["key"], f["values"], f["mode"]) for f in filters_to_check)
+    return set()
 
 
-def build_label_agents_map(labels_df, endpoint_agents_df):
+def build_label_agents_map(labels_df, agent_lookups):
     """
     Returns a dict: { label_id: set_of_agent_ids }
-    by checking each label's filters against each agent.
+    by resolving each label's filters against `agent_lookups` (the
+    preprocessed indexes from build_agent_lookups, not the raw agents frame).
+    An agent matches a label if it matches all filters (matchType=and, the
+    default) or at least one filter (matchType=or).
     """
+    ids = agent_lookups["ids"]
     label_agents = {}
 
-    for lbl_idx, lbl_row in labels_df.iterrows():
+    # Missing values become "" so empty filters / matchType are simply falsy
+    for lbl_row in labels_df.fillna("").to_dict("records"):
         label_id = lbl_row["id"]
-        matching_agents = set()
 
-        for ag_idx, ag_row in endpoint_agents_df.iterrows():
-            agent_id = ag_row["id"]
-            if agent_matches_label(ag_row, lbl_row):
-                matching_agents.add(agent_id)
+        match_type = (lbl_row["matchType"] or "").lower().strip()
+        if not match_type:
+            match_type = "and"  # default if missing
 
-        label_agents[label_id] = matching_agents
+        # Each filter column is stored as a comma string
+        filter_rows = []
+        for col, filter_key in LABEL_FILTER_KEYS.items():
+            if lbl_row.get(col):
+                vals = [v.strip() for v in lbl_row[col].split(",") if v.strip()]
+                filter_rows.append(_agents_matching_filter(agent_lookups, filter_key, vals))
+
+        if match_type == "and":
+            # ALL must pass (a label with no filters matches every agent)
+            rows = set.intersection(*filter_rows) if filter_rows else range(len(ids))
+        else:
+            # OR => any pass
+            rows = set().union(*filter_rows)
+        label_agents[label_id] = {ids[row] for row in rows}
 
     return label_agents
 
@@ -369,23 +582,24 @@ def build_test_agents_map(scheduled_tests_df, label_agents_map, endpoint_agents_
     all_agent_ids = set(endpoint_agents_df["id"].unique())
 
     test_agents = {}
-    for idx, test_row in scheduled_tests_df.iterrows():
-        t_id = test_row["testID"]
-        sel_type = test_row["agentSelectorType"]
-
+    # Zip the columns directly rather than boxing each row into a Series
+    for t_id, sel_type, agents_raw, labels_raw in zip(
+        scheduled_tests_df["testID"].to_numpy(),
+        scheduled_tests_df["agentSelectorType"].to_numpy(),
+        scheduled_tests_df["assignedAgentsRaw"].to_numpy(),
+        scheduled_tests_df["assignedLabelsRaw"].to_numpy(),
+    ):
         assigned_ids = set()
         if sel_type == "all-agents":
             assigned_ids = set(all_agent_ids)
 
         elif sel_type == "specific-agents":
-            # parse test_row["assignedAgentsRaw"] -> "agent-id1,agent-id2"
-            raw = test_row.get("assignedAgentsRaw", "")
-            assigned_ids = {a.strip() for a in raw.split(",") if a.strip()}
+            # parse agents_raw -> "agent-id1,agent-id2"
+            assigned_ids = {a.strip() for a in agents_raw.split(",") if a.strip()}
 
         elif sel_type == "agent-labels":
-            # parse test_row["assignedLabelsRaw"] -> "140737488492028,140737488493860"
-            raw = test_row.get("assignedLabelsRaw", "")
-            label_ids = {lbl.strip() for lbl in raw.split(",") if lbl.strip()}
+            # parse labels_raw -> "140737488492028,140737488493860"
+            label_ids = {lbl.strip() for lbl in labels_raw.split(",") if lbl.strip()}
             for lid in label_ids:
                 # union with label_agents_map[lid]
                 if lid in label_agents_map:
@@ -396,21 +610,92 @@ def build_test_agents_map(scheduled_tests_df, label_agents_map, endpoint_agents_
     return test_agents
 
 
+def _read_cache(cache_path: str, read):
+    """
+    Return `read(cache_path)`, or None if there is no cache file or it can't
+    be read (e.g. truncated), so the caller re-parses.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        return read(cache_path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable cache file '{cache_path}': {e}")
+        return None
+
+
+def _write_cache(cache_path: str, write):
+    """
+    Best-effort save of a cache file: `write(path)` writes it to a temp file
+    which is moved into place with os.replace, so an interrupted write never
+    leaves a truncated cache file behind; any failure (e.g. read-only
+    CACHE_DIR) only logs a warning.
+    """
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        write(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning(f"Could not write cache file '{cache_path}': {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _evict_cache(name_pattern: str, keep: set):
+    """
+    Delete the files in CACHE_DIR whose whole name matches the regex
+    `name_pattern` (a cache file name this script writes), along with their
+    leftover temp files, except the names in `keep`. Anything else in
+    CACHE_DIR is left alone. Best-effort: failures are ignored.
+    """
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name not in keep and re.fullmatch(rf"(?:{name_pattern})(?:\.\d+\.tmp)?", name):
+            try:
+                os.remove(os.path.join(CACHE_DIR, name))
+            except OSError:
+                pass
+
+
 def get_account_ids(file_path: str) -> pd.DataFrame:
     """
-    Reads an Excel file containing account IDs in one tab.
+    Reads an Excel file containing account IDs in one tab, or a CSV file
+    (if `file_path` ends in .csv) with the same columns.
     Expected columns:
         - accountGroupName
         - aid
     Returns a DataFrame with columns: [accountGroupName, aid]
     """
     logger.info(f"Reading account IDs from '{file_path}'...")
-    df = pd.read_excel(file_path, sheet_name=0)  # read the first sheet
+    if file_path.lower().endswith(".csv"):
+        df = pd.read_csv(file_path)
+    else:
+        # Keyed on the read engine too, since engines can parse cells differently
+        file_hash = hashlib.blake2b(repr(EXCEL_READ_ENGINE).encode(), digest_size=16)
+        with open(file_path, "rb") as f:
+            file_hash.update(f.read())
+        cache_name = f"account_ids-{file_hash.hexdigest()}.json"
+        cache_path = os.path.join(CACHE_DIR, cache_name)
+        df = _read_cache(cache_path, functools.partial(pd.read_json, orient="table"))
+        if df is not None:
+            logger.debug(f"Using cached account IDs from '{cache_path}'.")
+        else:
+            df = pd.read_excel(file_path, sheet_name=0, engine=EXCEL_READ_ENGINE)  # read the first sheet
+            _write_cache(cache_path, functools.partial(df.to_json, orient="table", index=False))
+            # Only the current input's cache is worth keeping (.pkl files are
+            # from older versions of this script, which cached as pickle)
+            _evict_cache(r"account_ids-[0-9a-f]{32}\.(?:json|pkl)", keep={cache_name})
     # Ensure required columns are present
     required_cols = {"accountGroupName", "aid"}
     if not required_cols.issubset(df.columns):
-        logger.error("Excel file must contain 'accountGroupName' and 'aid' columns.")
-        raise ValueError("Excel must contain 'accountGroupName' and 'aid' columns.")
+        logger.error(f"'{file_path}' must contain 'accountGroupName' and 'aid' columns.")
+        raise ValueError(f"'{file_path}' must contain 'accountGroupName' and 'aid' columns.")
     logger.success("Account IDs read successfully.")
     return df[["accountGroupName", "aid"]]
 
@@ -439,39 +724,45 @@ def build_test_agent_assignment_df(scheduled_tests_df, test_agents_map, endpoint
     return pd.DataFrame(rows)
 
 
-def fetch_agents(aid: str) -> pd.DataFrame:
+def _with_account_group(cols: dict, account_group_name: str, aid: str) -> dict:
+    """
+    Return a fetcher's column lists with "accountGroupName" and "aid" as the
+    leading columns, so main() can extend its per-category columns directly
+    and build each final DataFrame exactly once.
+    """
+    n = len(next(iter(cols.values())))
+    return {
+        "accountGroupName": [account_group_name] * n,
+        "aid": [aid] * n,
+        **cols
+    }
+
+
+async def fetch_agents(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                       aid: str, account_group_name: str) -> dict:
     """
     Fetch Enterprise Agents for a given Account ID.
     Endpoint: /agents?aid=XXXXXXX
     """
     url = f"{BASE_URL}/agents?aid={aid}"
     logger.info(f"Fetching Agents for AID={aid} from '{url}'...")
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-
-    data = resp.json().get("agents", [])
+    data = (await _get_json(client, sem, url)).get("agents", [])
     logger.info(f"Received {len(data)} Agents for AID={aid}.")
-    records = []
-    for agent in data:
-        records.append({
-            "OrgId": agent.get("orgId"),
-            "agentId": agent.get("agentId"),
-            "agentName": agent.get("agentName"),
-            "agentType": agent.get("agentType"),
-            "agentState": agent.get("agentState"),
-            "lastSeen": agent.get("lastSeen"),
-            "createdDate": agent.get("createdDate"),
-            "utilization": agent.get("utilization"),
-            "location": agent.get("location"),
-            "enabled": agent.get("enabled"),
-            "hostname": agent.get("hostname"),
-            "ipAddresses": ", ".join(agent.get("ipAddresses", []))
-            if isinstance(agent.get("ipAddresses"), list) else ""
-        })
-    return pd.DataFrame(records)
-
-
-def fetch_endpoint_agents(aid: str) -> pd.DataFrame:
+    cols = {k: [] for k in AGENT_FIELDS}
+    for col, key in AGENT_SOURCE_KEYS.items():
+        cols[col] = [agent.get(key) for agent in data]
+
+    # Join the ipAddresses lists in one pass; missing lists become ""
+    ip_lists = [
+        ips if isinstance(ips, list) else None
+        for ips in (agent.get("ipAddresses") for agent in data)
+    ]
+    cols["ipAddresses"] = pd.Series(ip_lists, dtype=object).str.join(", ").fillna("").tolist()
+    return _with_account_group(cols, account_group_name, aid)
+
+
+async def fetch_endpoint_agents(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                                aid: str, account_group_name: str) -> dict:
     """
     Fetch Endpoint Agents for a given Account ID, with expanded details
     from 'clients', 'vpnProfiles', and 'networkInterfaceProfiles'.
@@ -480,6 +771,7 @@ def fetch_endpoint_agents(aid: str) -> pd.DataFrame:
 
     Returns columns:
     [
+      "accountGroupName", "aid",
       "id", "name", "computerName", "osVersion", "platform", "lastSeen", "status",
       "deleted", "version", "createdAt", "numberOfClients", "locationName",
       "agentType", "licenseType",
@@ -492,18 +784,18 @@ def fetch_endpoint_agents(aid: str) -> pd.DataFrame:
         f"{BASE_URL}/endpoint/agents?aid={aid}"
         f"&expand=clients,vpnProfiles,networkInterfaceProfiles"
     )
+    if ENDPOINT_AGENTS_PAGE_SIZE:
+        next_url += f"&max={ENDPOINT_AGENTS_PAGE_SIZE}"
     logger.info(
         f"Fetching Endpoint Agents for AID={aid} from '{next_url}' using HAL+JSON headers..."
     )
 
-    all_records = []
+    # Collect the raw records from every page, then project columns once
+    agents = []
     page_count = 1
 
     while next_url:
-        resp = requests.get(next_url, headers=HEADERS_HAL)
-        resp.raise_for_status()
-
-        data = resp.json()
+        data = await _get_json(client, sem, next_url, headers=HEADERS_HAL)
         agents_list = data.get("agents", [])
 
         links = data.get("_links", {})
@@ -514,94 +806,85 @@ def fetch_endpoint_agents(aid: str) -> pd.DataFrame:
             f"{'Continuing...' if next_link else 'No more pages.'}"
         )
 
-        for agent in agents_list:
-            location_obj = agent.get("location", {}) or {}
-            location_name = location_obj.get("locationName", "")
-
-            # 1) Collect any usernames found in the 'clients' array
-            username_set = set()
-            for c in agent.get("clients", []):
-                user_profile = c.get("userProfile", {})
-                uname = user_profile.get("userName")
-                if uname:
-                    username_set.add(uname.strip())
-
-            # 2) Parse networkInterfaceProfiles to gather local IPv4 addresses, gateways, hardware types
-            local_ipv4_set = set()
-            gateway_set = set()
-            hardware_set = set()
-
-            for nic in agent.get("networkInterfaceProfiles", []):
-                hardware_type = nic.get("hardwareType", "")
-                if hardware_type:
-                    hardware_set.add(hardware_type)
-
-                address_profiles = nic.get("addressProfiles", [])
-                for ap in address_profiles:
-                    # 'addressType' can be "unique-local", "unique-global", etc.
-                    # We'll check if the ipAddress is a private IPv4 (e.g., 10.x, 192.168.x, 172.16-31.x)
-                    ip_addr = ap.get("ipAddress", "")
-                    gateway = ap.get("gateway", "")
-                    if gateway:
-                        gateway_set.add(gateway)
-
-                    # Check if ip_addr is private IPv4
-                    # A quick approach is to check if it starts with 10., 192.168., or 172.(16-31).
-                    if is_private_ipv4(ip_addr):
-                        local_ipv4_set.add(ip_addr)
-
-            # 3) Collect VPN details if any
-            vpn_info_list = []
-            for vpnp in agent.get("vpnProfiles", []):
-                # Example: "vpnType": "cisco-anyconnect"
-                #          "vpnGatewayAddress": "165.214.12.240"
-                #          "vpnClientAddresses": ["10.155.159.173"]
-                #          "vpnClientNetworkRange": ["10.155.144.0/20"]
-                vpn_type = vpnp.get("vpnType", "")
-                vpn_gateway = vpnp.get("vpnGatewayAddress", "")
-                client_addrs = vpnp.get("vpnClientAddresses", [])
-                client_ranges = vpnp.get("vpnClientNetworkRange", [])
-
-                # Build a concise string
-                # e.g. "vpnType=cisco-anyconnect,gateway=165.214.12.240,client=10.155.159.173,ranges=10.155.144.0/20"
-                info_str = (
-                    f"vpnType={vpn_type},"
-                    f"gateway={vpn_gateway},"
-                    f"client={';'.join(client_addrs)},"
-                    f"ranges={';'.join(client_ranges)}"
-                )
-                vpn_info_list.append(info_str)
-
-            # Build final dict for this agent
-            record = {
-                "id": agent.get("id"),
-                "name": agent.get("name"),
-                "computerName": agent.get("computerName"),
-                "osVersion": agent.get("osVersion"),
-                "platform": agent.get("platform"),
-                "lastSeen": agent.get("lastSeen"),
-                "status": agent.get("status"),
-                "deleted": agent.get("deleted"),
-                "version": agent.get("version"),
-                "createdAt": agent.get("createdAt"),
-                "numberOfClients": agent.get("numberOfClients"),
-                "locationName": location_name,
-                "agentType": agent.get("agentType"),
-                "licenseType": agent.get("licenseType"),
-                # Our new fields
-                "usernames": ",".join(sorted(username_set)),
-                "localIpv4": ",".join(sorted(local_ipv4_set)),
-                "gatewayIpv4": ",".join(sorted(gateway_set)),
-                "hardwareTypes": ",".join(sorted(hardware_set)),
-                "vpnInfo": "|".join(vpn_info_list),  # or some other delimiter
-            }
-
-            all_records.append(record)
-
+        agents.extend(agents_list)
         next_url = next_link
         page_count += 1
 
-    return pd.DataFrame(all_records)
+    cols = {k: [] for k in ENDPOINT_AGENT_FIELDS}
+
+    # Fields copied straight from each record: one pass per column
+    for col, key in ENDPOINT_AGENT_SOURCE_KEYS.items():
+        cols[col] = [agent.get(key) for agent in agents]
+
+    # Nested location name ('location' may be missing or null)
+    cols["locationName"] = [
+        (agent.get("location") or {}).get("locationName", "") for agent in agents
+    ]
+
+    # Derived fields: joined lists
+    for agent in agents:
+        # 1) Collect any usernames found in the 'clients' array
+        username_set = set()
+        for c in agent.get("clients", []):
+            user_profile = c.get("userProfile", {})
+            uname = user_profile.get("userName")
+            if uname:
+                username_set.add(uname.strip())
+
+        # 2) Parse networkInterfaceProfiles to gather local IPv4 addresses, gateways, hardware types
+        local_ipv4_set = set()
+        gateway_set = set()
+        hardware_set = set()
+
+        for nic in agent.get("networkInterfaceProfiles", []):
+            hardware_type = nic.get("hardwareType", "")
+            if hardware_type:
+                hardware_set.add(hardware_type)
+
+            address_profiles = nic.get("addressProfiles", [])
+            for ap in address_profiles:
+                # 'addressType' can be "unique-local", "unique-global", etc.
+                # We'll check if the ipAddress is a private IPv4 (e.g., 10.x, 192.168.x, 172.16-31.x)
+                ip_addr = ap.get("ipAddress", "")
+                gateway = ap.get("gateway", "")
+                if gateway:
+                    gateway_set.add(gateway)
+
+                # Check if ip_addr is private IPv4
+                # A quick approach is to check if it starts with 10., 192.168., or 172.(16-31).
+                if is_private_ipv4(ip_addr):
+                    local_ipv4_set.add(ip_addr)
+
+        # 3) Collect VPN details if any
+        vpn_info_list = []
+        for vpnp in agent.get("vpnProfiles", []):
+            # Example: "vpnType": "cisco-anyconnect"
+            #          "vpnGatewayAddress": "165.214.12.240"
+            #          "vpnClientAddresses": ["10.155.159.173"]
+            #          "vpnClientNetworkRange": ["10.155.144.0/20"]
+            vpn_type = vpnp.get("vpnType", "")
+            vpn_gateway = vpnp.get("vpnGatewayAddress", "")
+            client_addrs = vpnp.get("vpnClientAddresses", [])
+            client_ranges = vpnp.get("vpnClientNetworkRange", [])
+
+            # Build a concise string
+            # e.g. "vpnType=cisco-anyconnect,gateway=165.214.12.240,client=10.155.159.173,ranges=10.155.144.0/20"
+            info_str = (
+                f"vpnType={vpn_type},"
+                f"gateway={vpn_gateway},"
+                f"client={';'.join(client_addrs)},"
+                f"ranges={';'.join(client_ranges)}"
+            )
+            vpn_info_list.append(info_str)
+
+        # Our new fields
+        cols["usernames"].append(",".join(sorted(username_set)))
+        cols["localIpv4"].append(",".join(sorted(local_ipv4_set)))
+        cols["gatewayIpv4"].append(",".join(sorted(gateway_set)))
+        cols["hardwareTypes"].append(",".join(sorted(hardware_set)))
+        cols["vpnInfo"].append("|".join(vpn_info_list))  # or some other delimiter
+
+    return _with_account_group(cols, account_group_name, aid)
 
 
 def is_private_ipv4(ip: str) -> bool:
@@ -633,50 +916,34 @@ def is_private_ipv4(ip: str) -> bool:
     return False
 
 
-def fetch_enterprise_tests(aid: str) -> pd.DataFrame:
+async def fetch_enterprise_tests(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                                 aid: str, account_group_name: str) -> dict:
     """
     Fetch the list of Enterprise Tests for a given Account ID.
     Endpoint: /tests?aid=XXXXXXX
     """
     url = f"{BASE_URL}/tests?aid={aid}"
     logger.info(f"Fetching Enterprise Tests for AID={aid} from '{url}'...")
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-
-    data = resp.json().get("tests", [])
+    data = (await _get_json(client, sem, url)).get("tests", [])
     logger.info(f"Received {len(data)} Enterprise Tests for AID={aid}.")
-    records = []
-    for test in data:
-        records.append({
-            "testID": test.get("testId"),
-            "testName": test.get("testName"),
-            "createdBy": test.get("createdBy"),
-            "createdDate": test.get("createdDate"),
-            "modifiedBy": test.get("modifiedBy"),
-            "modifiedDate": test.get("modifiedDate"),
-            "type": test.get("type"),
-            "alertsEnabled": test.get("alertsEnabled"),
-            "enabled": test.get("enabled"),
-            "direction": test.get("direction"),
-            "targetAgentID": test.get("targetAgentId")
-        })
-    return pd.DataFrame(records)
-
-
-def fetch_scheduled_tests(aid: str) -> pd.DataFrame:
+    cols = {k: [] for k in ENTERPRISE_TEST_FIELDS}
+    for col, key in ENTERPRISE_TEST_SOURCE_KEYS.items():
+        cols[col] = [test.get(key) for test in data]
+    return _with_account_group(cols, account_group_name, aid)
+
+
+async def fetch_scheduled_tests(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                                aid: str, account_group_name: str) -> dict:
     """
     Fetch the scheduled endpoint tests for a given Account ID.
     Endpoint: /endpoint/tests/scheduled-tests?aid=XXXXXXX
     """
     url = f"{BASE_URL}/endpoint/tests/scheduled-tests?aid={aid}"
     logger.info(f"Fetching Scheduled Tests for AID={aid} from '{url}'...")
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-
-    data = resp.json().get("tests", [])
+    data = (await _get_json(client, sem, url)).get("tests", [])
     logger.info(f"Received {len(data)} Scheduled Tests for AID={aid}.")
 
-    records = []
+    cols = {k: [] for k in SCHEDULED_TEST_FIELDS}
     for test in data:
         # Pull out agentSelectorConfig
         agent_selector_config = test.get("agentSelectorConfig", {})
@@ -691,25 +958,24 @@ def fetch_scheduled_tests(aid: str) -> pd.DataFrame:
         endpoint_labels = agent_selector_config.get("endpointAgentLabels", [])
 
         # Everything else is the standard fields
-        records.append({
-            "testID": test.get("testId"),
-            "testName": test.get("testName"),
-            "server": test.get("server"),
-            "createdDate": test.get("createdDate"),
-            "type": test.get("type"),
-            "isEnabled": test.get("isEnabled"),
-            "agentSelectorType": agent_selector_type,
-            # Join arrays into comma-separated strings for easy viewing in Excel
-            "assignedAgentsRaw": ",".join(specific_agents) if specific_agents else "",
-            "assignedLabelsRaw": ",".join(endpoint_labels) if endpoint_labels else "",
-            # You can also store maxMachines if needed
-            "maxMachines": agent_selector_config.get("maxMachines", None)
-        })
-
-    return pd.DataFrame(records)
-
-
-def fetch_labels(aid: str) -> pd.DataFrame:
+        cols["testID"].append(test.get("testId"))
+        cols["testName"].append(test.get("testName"))
+        cols["server"].append(test.get("server"))
+        cols["createdDate"].append(test.get("createdDate"))
+        cols["type"].append(test.get("type"))
+        cols["isEnabled"].append(test.get("isEnabled"))
+        cols["agentSelectorType"].append(agent_selector_type)
+        # Join arrays into comma-separated strings for easy viewing in Excel
+        cols["assignedAgentsRaw"].append(",".join(specific_agents) if specific_agents else "")
+        cols["assignedLabelsRaw"].append(",".join(endpoint_labels) if endpoint_labels else "")
+        # You can also store maxMachines if needed
+        cols["maxMachines"].append(agent_selector_config.get("maxMachines", None))
+
+    return _with_account_group(cols, account_group_name, aid)
+
+
+async def fetch_labels(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                       aid: str, account_group_name: str) -> dict:
     """
     Fetch endpoint labels for a given Account ID, with filter details expanded,
     including agent-id, username, local-network, vpn-vendor, connection, etc.
@@ -718,18 +984,11 @@ def fetch_labels(aid: str) -> pd.DataFrame:
     """
     url = f"{BASE_URL}/endpoint/labels?aid={aid}&expand=filters"
     logger.info(f"Fetching Labels for AID={aid} from '{url}'...")
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
-
-    data = resp.json().get("labels", [])
+    data = (await _get_json(client, sem, url)).get("labels", [])
     logger.info(f"Received {len(data)} Labels for AID={aid}.")
 
-    records = []
+    cols = {k: [] for k in LABEL_FIELDS}
     for label in data:
-        label_id = label.get("id")
-        name = label.get("name")
-        color = label.get("color")
-        match_type = label.get("matchType", "")
 
         # Track various filter keys. Now includes 'agent-id'.
         filter_info = {
@@ -747,25 +1006,47 @@ def fetch_labels(aid: str) -> pd.DataFrame:
             if key in filter_info:
                 filter_info[key].extend(vals)
 
-        # Create one record for this label
-        row = {
-            "id": label_id,
-            "name": name,
-            "color": color,
-            "matchType": match_type,
-            "agent_id_filter": ",".join(filter_info["agent-id"]),
-            "local_network_filter": ",".join(filter_info["local-network"]),
-            "vpn_vendor_filter": ",".join(filter_info["vpn-vendor"]),
-            "connection_filter": ",".join(filter_info["connection"]),
-            "username_filter": ",".join(filter_info["username"]),
-        }
-        records.append(row)
+        # Append this label's values to each column
+        cols["id"].append(label.get("id"))
+        cols["name"].append(label.get("name"))
+        cols["color"].append(label.get("color"))
+        cols["matchType"].append(label.get("matchType", ""))
+        cols["agent_id_filter"].append(",".join(filter_info["agent-id"]))
+        cols["local_network_filter"].append(",".join(filter_info["local-network"]))
+        cols["vpn_vendor_filter"].append(",".join(filter_info["vpn-vendor"]))
+        cols["connection_filter"].append(",".join(filter_info["connection"]))
+        cols["username_filter"].append(",".join(filter_info["username"]))
 
-    df = pd.DataFrame(records)
-    return df
+    return _with_account_group(cols, account_group_name, aid)
 
 
-def fetch_usage(aid: str):
+def _cast_usage_frame(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Cast each column of a /usage frame to its dtype in `dtypes`. A column
+    whose values don't fit (e.g. 2.5 or "n/a" in an Int64 count) is logged
+    and kept exactly as the API returned it, so one unexpected value can't
+    abort the whole collection.
+    """
+    cast = {}
+    for col, dtype in dtypes.items():
+        try:
+            cast[col] = df[col].astype(dtype)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Usage column '{col}' doesn't fit dtype {dtype}; writing it uncast: {e}")
+    return df.assign(**cast)
+
+
+def _usage_frame(records: list, dtypes: dict) -> pd.DataFrame:
+    """
+    Build one /usage breakdown frame from its API records: one plain tuple
+    per record (missing keys become None), columns and dtypes from `dtypes`.
+    """
+    columns = list(dtypes)
+    rows = [tuple(map(record.get, columns)) for record in records]
+    return _cast_usage_frame(pd.DataFrame.from_records(rows, columns=columns), dtypes)
+
+
+async def fetch_usage(client: httpx.AsyncClient, sem: asyncio.Semaphore, aid: str):
     """
     Calls /usage?aid={AID}&expand=endpoint-agent&expand=test&expand=enterprise-agent
     Returns a dict of DataFrames:
@@ -782,10 +1063,49 @@ def fetch_usage(aid: str):
         f"&expand=endpoint-agent&expand=test&expand=enterprise-agent"
     )
     logger.info(f"Fetching Usage info for AID={aid} from '{url}'...")
-    resp = requests.get(url, headers=HEADERS)
-    resp.raise_for_status()
+    raw = await _get_bytes(client, sem, url)
+
+    if USAGE_CACHE_ENABLED:
+        # Usage changes slowly, so an identical response (for the same AID and
+        # the same parsed schema) reuses the frames parsed on an earlier run
+        response_hash = hashlib.blake2b(digest_size=16)
+        response_hash.update(repr((
+            USAGE_CACHE_VERSION, USAGE_SUMMARY_DTYPES, USAGE_TEST_DTYPES,
+            USAGE_ENDPOINT_AGENT_DTYPES, USAGE_ENTERPRISE_AGENT_DTYPES, aid
+        )).encode())
+        response_hash.update(raw)
+        # One parquet file per frame: usage-<hash>-<frame>.parquet
+        cache_names = {
+            frame: f"usage-{response_hash.hexdigest()}-{frame}.parquet"
+            for frame in USAGE_FRAMES
+        }
+        cache_paths = {frame: os.path.join(CACHE_DIR, name) for frame, name in cache_names.items()}
+        cached = {
+            frame: _read_cache(path, functools.partial(pd.read_parquet, engine="pyarrow"))
+            for frame, path in cache_paths.items()
+        }
+        if all(df is not None for df in cached.values()):
+            logger.debug(f"Using cached usage frames from '{cache_paths['summary']}' (and siblings).")
+            return cached
+
+    usage_frames = _parse_usage(orjson.loads(raw), aid)
+    if USAGE_CACHE_ENABLED:
+        for frame, path in cache_paths.items():
+            _write_cache(path, functools.partial(
+                usage_frames[frame].to_parquet, engine="pyarrow", index=False))
+    # Usage bodies change between most runs, so only the latest entry is worth
+    # keeping (.pkl entries are from older versions, which cached as pickle)
+    _evict_cache(
+        rf"usage-[0-9a-f]{{32}}(?:-(?:{'|'.join(USAGE_FRAMES)})\.parquet|\.pkl)",
+        keep=set(cache_names.values()) if USAGE_CACHE_ENABLED else set()
+    )
+    return usage_frames
+
 
-    data = resp.json()
+def _parse_usage(data: dict, aid: str) -> dict:
+    """
+    Build fetch_usage's dict of DataFrames from the decoded /usage body.
+    """
     usage_obj = data.get("usage", {})
 
     # 1) Usage Summary
@@ -813,33 +1133,18 @@ def fetch_usage(aid: str):
         "connectedDevicesUnitsProjected": usage_obj.get("connectedDevicesUnitsProjected"),
         "connectedDevicesUnitsNextBillingPeriod": usage_obj.get("connectedDevicesUnitsNextBillingPeriod"),
     }
-    usage_summary_df = pd.DataFrame([usage_summary])  # single row
+    usage_summary_df = _cast_usage_frame(
+        pd.DataFrame({k: [v] for k, v in usage_summary.items()}),  # single row
+        USAGE_SUMMARY_DTYPES
+    )
 
     # 2) Usage Tests
     tests_list = usage_obj.get("tests", [])
-    usage_tests_records = []
-    for t in tests_list:
-        usage_tests_records.append({
-            "aid"             : t.get("aid"),
-            "testId"          : t.get("testId"),
-            "accountGroupName": t.get("accountGroupName"),
-            "testName"        : t.get("testName"),
-            "testType"        : t.get("testType"),
-            "cloudUnitsUsed"  : t.get("cloudUnitsUsed"),
-            "cloudUnitsProjected": t.get("cloudUnitsProjected")
-        })
-    usage_tests_df = pd.DataFrame(usage_tests_records)
+    usage_tests_df = _usage_frame(tests_list, USAGE_TEST_DTYPES)
 
     # 3) Usage Endpoint Agents
     endpoint_agents_list = usage_obj.get("endpointAgents", [])
-    usage_endpoint_agents_records = []
-    for ea in endpoint_agents_list:
-        usage_endpoint_agents_records.append({
-            "aid"              : ea.get("aid"),
-            "accountGroupName" : ea.get("accountGroupName"),
-            "endpointAgentsUsed": ea.get("endpointAgentsUsed")
-        })
-    usage_endpoint_agents_df = pd.DataFrame(usage_endpoint_agents_records)
+    usage_endpoint_agents_df = _usage_frame(endpoint_agents_list, USAGE_ENDPOINT_AGENT_DTYPES)
 
     # 4) Usage Enterprise Agents
     #    The sample JSON might have enterpriseAgents in the same "usage" object.
@@ -847,14 +1152,7 @@ def fetch_usage(aid: str):
     #    The sample snippet shows enterprise agents info was appended inside "endpointAgents" or something.
     #    If there's a separate key "enterpriseAgents", do something like below:
     enterprise_agents_list = usage_obj.get("enterpriseAgents", [])
-    usage_enterprise_agents_records = []
-    for ea in enterprise_agents_list:
-        usage_enterprise_agents_records.append({
-            "aid"                : ea.get("aid"),
-            "accountGroupName"   : ea.get("accountGroupName"),
-            "enterpriseAgentsUsed": ea.get("enterpriseAgentsUsed")
-        })
-    usage_enterprise_agents_df = pd.DataFrame(usage_enterprise_agents_records)
+    usage_enterprise_agents_df = _usage_frame(enterprise_agents_list, USAGE_ENTERPRISE_AGENT_DTYPES)
 
     return {
         "summary"           : usage_summary_df,
@@ -864,173 +1162,113 @@ def fetch_usage(aid: str):
     }
 
 
+async def process_aid(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                      account_group_name: str, aid: str):
+    """
+    Fetch all per-account-group categories for one AID concurrently.
+    Returns a tuple of column dicts (column name -> list of values):
+        (agents, endpoint_agents, enterprise_tests, scheduled_tests, labels)
+    each with "accountGroupName" and "aid" as the first columns.
+    """
+    logger.info(f"Processing accountGroupName='{account_group_name}', AID={aid}...")
+    return await asyncio.gather(
+        fetch_agents(client, sem, aid, account_group_name),
+        fetch_endpoint_agents(client, sem, aid, account_group_name),
+        fetch_enterprise_tests(client, sem, aid, account_group_name),
+        fetch_scheduled_tests(client, sem, aid, account_group_name),
+        fetch_labels(client, sem, aid, account_group_name),
+    )
+
+
+async def fetch_all(account_groups_df: pd.DataFrame):
+    """
+    Fetch data for every account group, plus the single usage call, all
+    concurrently over one shared connection pool.
+
+    Returns (per_aid_results, usage_data) where per_aid_results is a list of
+    process_aid() tuples (one per account group) and usage_data is the
+    fetch_usage() dict, or None if there are no account groups.
+    """
+    if account_groups_df.empty:
+        return [], None
+
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    transport = httpx.AsyncHTTPTransport(limits=HTTP_LIMITS, retries=HTTP_CONNECT_RETRIES)
+    # follow_redirects keeps requests' old behavior (httpx defaults to off)
+    async with httpx.AsyncClient(transport=transport, timeout=HTTP_TIMEOUT,
+                                 headers=HEADERS, follow_redirects=True) as client:
+        # Cast aid to str once for the whole column, then zip plain arrays
+        aids = account_groups_df["aid"].astype(str).to_numpy()
+        tasks = [
+            process_aid(client, sem, account_group_name, aid)
+            for account_group_name, aid in zip(
+                account_groups_df["accountGroupName"].to_numpy(), aids)
+        ]
+
+        # We'll pick the first row's AID from the account_groups_df. The usage
+        # call doesn't depend on the per-AID data, so it runs alongside it.
+        top_level_aid = aids[0]
+        logger.info(f"Fetching usage data once using AID={top_level_aid}...")
+        usage_data, *per_aid_results = await asyncio.gather(
+            fetch_usage(client, sem, top_level_aid), *tasks)
+
+    return per_aid_results, usage_data
+
+
 def main():
     logger.info("Starting ThousandEyes data collection script...")
 
-    # 1) Read account groups from local Excel file
-    account_groups_df = get_account_ids("account_ids.xlsx")
+    # 1) Read account groups from local Excel (or CSV) file
+    account_groups_df = get_account_ids(ACCOUNT_IDS_FILE)
     account_groups_tab = account_groups_df.copy()
 
     # We'll store final results in a dict of DataFrames (sheet_name -> DataFrame)
     sheets = {"Account Groups": account_groups_tab}
 
-    # Prepare lists to aggregate data
-    agents_records = []
-    endpoint_agents_records = []
-    enterprise_tests_records = []
-    scheduled_tests_records = []
-    labels_records = []
-
-    # 2) For each account group, fetch data
-    # (No usage call inside this loop anymore!)
-    for idx, row in account_groups_df.iterrows():
-        account_group_name = row["accountGroupName"]
-        aid = str(row["aid"])
-        logger.info(f"Processing accountGroupName='{account_group_name}', AID={aid}...")
-
-        # ---- A) Enterprise Agents ----
-        agents_df = fetch_agents(aid)
-        if not agents_df.empty:
-            agents_df.insert(0, "aid", aid)
-            agents_df.insert(0, "accountGroupName", account_group_name)
-            agents_records.append(agents_df)
-
-        # ---- B) Endpoint Agents ----
-        endpoint_agents_df = fetch_endpoint_agents(aid)
-        if not endpoint_agents_df.empty:
-            endpoint_agents_df.insert(0, "aid", aid)
-            endpoint_agents_df.insert(0, "accountGroupName", account_group_name)
-            endpoint_agents_records.append(endpoint_agents_df)
-
-        # ---- C) Enterprise Tests ----
-        enterprise_tests_df = fetch_enterprise_tests(aid)
-        if not enterprise_tests_df.empty:
-            enterprise_tests_df.insert(0, "aid", aid)
-            enterprise_tests_df.insert(0, "accountGroupName", account_group_name)
-            enterprise_tests_records.append(enterprise_tests_df)
-
-        # ---- D) Scheduled Tests (Endpoint) ----
-        scheduled_df = fetch_scheduled_tests(aid)
-        if not scheduled_df.empty:
-            scheduled_df.insert(0, "aid", aid)
-            scheduled_df.insert(0, "accountGroupName", account_group_name)
-            scheduled_tests_records.append(scheduled_df)
-
-        # ---- E) Labels ----
-        labels_df = fetch_labels(aid)
-        if not labels_df.empty:
-            labels_df.insert(0, "aid", aid)
-            labels_df.insert(0, "accountGroupName", account_group_name)
-            labels_records.append(labels_df)
+    # Prepare per-category columns to aggregate data across all AIDs
+    agents_cols = defaultdict(list)
+    endpoint_agents_cols = defaultdict(list)
+    enterprise_tests_cols = defaultdict(list)
+    scheduled_tests_cols = defaultdict(list)
+    labels_cols = defaultdict(list)
+
+    # 2) Fetch data for every account group concurrently, plus the single usage call
+    per_aid_results, usage_data = asyncio.run(fetch_all(account_groups_df))
+
+    for aid_results in per_aid_results:
+        for category_cols, fetched_cols in zip(
+            (agents_cols, endpoint_agents_cols, enterprise_tests_cols,
+             scheduled_tests_cols, labels_cols),
+            aid_results,
+        ):
+            for col, values in fetched_cols.items():
+                category_cols[col].extend(values)
 
     logger.info("Finished fetching data from all accounts. Consolidating data...")
 
-    # 3) Concatenate or create empty dataframes for each category:
-
-    # ---- A) Enterprise Agents (Tab: Agents) ----
-    if agents_records:
-        agents_final_df = pd.concat(agents_records, ignore_index=True)
-    else:
-        agents_final_df = pd.DataFrame(
-            columns=[
-                "accountGroupName", "aid", "OrgId", "agentId", "agentName",
-                "agentType", "agentState", "lastSeen", "createdDate",
-                "utilization", "location", "enabled", "hostname", "ipAddresses"
-            ]
-        )
+    # 3) Build one DataFrame per category, in sheet column order (this also
+    #    gives an empty frame with headers if nothing was fetched):
+    agents_final_df = pd.DataFrame(agents_cols, columns=AGENT_COLUMNS)
     sheets["Agents"] = agents_final_df
 
-    # ---- B) Endpoint Agents (Tab: Endpoint Agents) ----
-    if endpoint_agents_records:
-        endpoint_agents_final_df = pd.concat(endpoint_agents_records, ignore_index=True)
-    else:
-        endpoint_agents_final_df = pd.DataFrame(
-            columns=[
-                "accountGroupName", "aid", "id", "name", "computerName", "osVersion",
-                "platform", "lastSeen", "status", "deleted", "version", "createdAt",
-                "numberOfClients", "locationName", "agentType", "licenseType",
-                "usernames", "localIpv4", "gatewayIpv4", "hardwareTypes", "vpnInfo"
-            ]
-        )
-
-    desired_order = [
-        "accountGroupName",
-        "aid",
-        "id",
-        "name",
-        "computerName",
-        "osVersion",
-        "platform",
-        "lastSeen",
-        "status",
-        "deleted",
-        "version",
-        "createdAt",
-        "numberOfClients",
-        "locationName",
-        "agentType",
-        "licenseType",
-        "usernames",
-        "localIpv4",
-        "gatewayIpv4",
-        "hardwareTypes",
-        "vpnInfo"
-    ]
-    endpoint_agents_final_df = endpoint_agents_final_df.reindex(columns=desired_order, fill_value="")
+    endpoint_agents_final_df = pd.DataFrame(endpoint_agents_cols, columns=ENDPOINT_AGENT_COLUMNS)
     sheets["Endpoint Agents"] = endpoint_agents_final_df
 
-    # ---- C) Enterprise Tests (Tab: Enterprise Test) ----
-    if enterprise_tests_records:
-        enterprise_tests_final_df = pd.concat(enterprise_tests_records, ignore_index=True)
-    else:
-        enterprise_tests_final_df = pd.DataFrame(
-            columns=[
-                "accountGroupName", "aid", "testID", "testName", "createdBy",
-                "createdDate", "modifiedBy", "modifiedDate", "type", "alertsEnabled",
-                "enabled", "direction", "targetAgentID"
-            ]
-        )
+    enterprise_tests_final_df = pd.DataFrame(enterprise_tests_cols, columns=ENTERPRISE_TEST_COLUMNS)
     sheets["Enterprise Test"] = enterprise_tests_final_df
 
-    # ---- D) Scheduled Test Endpoint Agent ----
-    if scheduled_tests_records:
-        scheduled_tests_final_df = pd.concat(scheduled_tests_records, ignore_index=True)
-    else:
-        scheduled_tests_final_df = pd.DataFrame(
-            columns=[
-                "accountGroupName", "aid", "testID", "testName", "server",
-                "createdDate", "type", "isEnabled",
-                "agentSelectorType",
-                "assignedAgentsRaw",
-                "assignedLabelsRaw"
-            ]
-        )
+    scheduled_tests_final_df = pd.DataFrame(scheduled_tests_cols, columns=SCHEDULED_TEST_COLUMNS)
     sheets["Scheduled Test Endpoint Agent"] = scheduled_tests_final_df
 
-    # ---- E) Labels ----
-    if labels_records:
-        labels_final_df = pd.concat(labels_records, ignore_index=True)
-    else:
-        labels_final_df = pd.DataFrame(
-            columns=[
-                "accountGroupName", "aid", "id", "name", "color", "matchType",
-                "agent_id_filter", "username_filter", "local_network_filter",
-                "vpn_vendor_filter", "connection_filter"
-            ]
-        )
-    label_columns_desired = [
-        "accountGroupName", "aid", "id", "name", "color", "matchType",
-        "local_network_filter", "vpn_vendor_filter", "connection_filter",
-        "username_filter", "agent_id_filter"
-    ]
-    labels_final_df = labels_final_df.reindex(columns=label_columns_desired, fill_value="")
+    labels_final_df = pd.DataFrame(labels_cols, columns=LABEL_COLUMNS)
     sheets["Labels"] = labels_final_df
 
     # ============= Correlation Steps =============
     logger.info("Building Label->Agent mapping and final Test->Agent assignments...")
 
     if not labels_final_df.empty and not endpoint_agents_final_df.empty:
-        label_agents_map = build_label_agents_map(labels_final_df, endpoint_agents_final_df)
+        agent_lookups = build_agent_lookups(endpoint_agents_final_df)
+        label_agents_map = build_label_agents_map(labels_final_df, agent_lookups)
     else:
         label_agents_map = {}
 
@@ -1046,17 +1284,10 @@ def main():
             endpoint_agents_final_df
         )
         sheets["Test ↔ Agent Assignments"] = assignments_df
-    else:
-        assignments_df = pd.DataFrame(columns=["testID", "testName", "agentID", "agentName"])
-        sheets["Test ↔ Agent Assignments"] = assignments_df
 
     # ============= SINGLE USAGE CALL =============
-    # We'll pick the first row's AID from the account_groups_df
-    if not account_groups_df.empty:
-        top_level_aid = str(account_groups_df.iloc[0]["aid"])
-        logger.info(f"Fetching usage data once using AID={top_level_aid}...")
-        usage_data = fetch_usage(top_level_aid)
-
+    # Fetched in fetch_all() using the first row's AID from the account_groups_df
+    if usage_data is not None:
         # parse the usage_data dict -> DataFrames
         usage_summary_df = usage_data["summary"]
         usage_tests_df = usage_data["tests"]
@@ -1074,30 +1305,36 @@ def main():
         sheets["Usage Tests"] = usage_tests_df
         sheets["Usage Endpoint Agents"] = usage_endpoint_df
         sheets["Usage Enterprise Agents"] = usage_ent_agents_df
-    else:
-        # no account groups => no usage
-        sheets["Usage Summary"] = pd.DataFrame()
-        sheets["Usage Tests"] = pd.DataFrame()
-        sheets["Usage Endpoint Agents"] = pd.DataFrame()
-        sheets["Usage Enterprise Agents"] = pd.DataFrame()
+    # (no account groups => no usage sheets)
 
     # 4) Write all sheets to a single Excel file
     timestamp_int = int(time.time())
     output_file = f"thousandeyes_data-{timestamp_int}.xlsx"
     logger.info(f"Writing all results to Excel file '{output_file}'...")
-    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-        for sheet_name, df in sheets.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
 
-    logger.success(f"Data successfully written to '{output_file}'. Now applying color fills and number formats...")
-
-    # 5) Color fills in "Labels"
-    _apply_color_fills(output_file, sheet_name="Labels", color_col="color")
+    # Numeric-looking text becomes real numbers here in pandas, so Excel gets
+    # numeric cells without a separate number-format pass. This runs after the
+    # correlation steps, which match on the original string IDs.
+    # Integer columns are then downcast to their narrowest dtype. Empty sheets
+    # are skipped rather than written as header-only tabs.
+    sheets = {
+        name: _downcast_integer_columns(_coerce_numeric_columns(df))
+        for name, df in sheets.items()
+        if not df.empty or name in XLSX_ENSURE_SHEETS
+    }
 
-    # 6) Auto-format numeric columns in all sheets
-    _auto_format_numbers(output_file)
+    # Rows are streamed straight into a single xlsxwriter workbook (with the
+    # Labels color fills applied as each row is written), so the file is
+    # serialized exactly once, on close, with a fast compression level.
+    with _xlsx_compresslevel(XLSX_COMPRESSLEVEL), \
+            xlsxwriter.Workbook(output_file, XLSX_WORKBOOK_OPTIONS) as workbook:
+        header_fmt = workbook.add_format(XLSX_HEADER_FORMAT)
+        for sheet_name, df in sheets.items():
+            # 5) Color fills in "Labels"
+            color_col = "color" if sheet_name == "Labels" else None
+            _write_sheet(workbook, sheet_name, df, header_fmt, color_col=color_col)
 
-    logger.success("All post-processing complete. Script finished.")
+    logger.success(f"Data successfully written to '{output_file}'. Script finished.")
 
 
 if __name__ == "__main__":